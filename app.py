@@ -1,12 +1,17 @@
 import streamlit as st
 import os
-import tempfile
-import json
+import time
+import orjson
 from datetime import datetime
-from src.biolit_miner.paper_ingestion import PaperIngestionEngine, PaperMetadata
+from src.biolit_miner.paper_ingestion import PaperIngestionEngine, PaperMetadata, PROMPT_TEXT_BUDGET
 from src.biolit_miner.method_extractor import MethodExtractor, ExtractedMethods
 from src.biolit_miner.code_generator import CodeGenerator, GeneratedCode
 from src.biolit_miner.qa_interface import InteractiveQA
+from src.biolit_miner.cache import content_key
+
+# Seconds between redraws of a streaming script; each redraw sends the whole
+# text so far to the browser, so redrawing per chunk is quadratic
+STREAM_RENDER_INTERVAL = 0.1
 
 # Page configuration
 st.set_page_config(
@@ -59,6 +64,27 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Engines are stateless between calls, so one instance per process is shared
+# across reruns and sessions. InteractiveQA holds per-user conversation state
+# and stays in session_state instead.
+@st.cache_resource
+def get_ingestion_engine() -> PaperIngestionEngine:
+    return PaperIngestionEngine()
+
+@st.cache_resource
+def get_method_extractor() -> MethodExtractor:
+    return MethodExtractor()
+
+@st.cache_resource
+def get_code_generator() -> CodeGenerator:
+    return CodeGenerator()
+
+@st.cache_data(show_spinner=False)
+def _process_pdf_bytes(pdf_bytes: bytes) -> PaperMetadata:
+    # Only the start of the paper reaches the prompts, so stop extracting once
+    # the budget is filled
+    return get_ingestion_engine().process_pdf_bytes(pdf_bytes, max_chars=PROMPT_TEXT_BUDGET)
+
 def initialize_session_state():
     if 'paper_metadata' not in st.session_state:
         st.session_state.paper_metadata = None
@@ -83,7 +109,7 @@ def display_header():
 def paper_ingestion_section():
     st.markdown('<div class="section-header">📄 Paper Ingestion</div>', unsafe_allow_html=True)
     
-    ingestion_engine = PaperIngestionEngine()
+    ingestion_engine = get_ingestion_engine()
     
     # Input method selection
     input_method = st.radio(
@@ -103,17 +129,11 @@ def paper_ingestion_section():
         
         if uploaded_file is not None:
             with st.spinner("Processing PDF..."):
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                    tmp_file.write(uploaded_file.getvalue())
-                    tmp_file_path = tmp_file.name
-                
                 try:
-                    paper_metadata = ingestion_engine.process_pdf_upload(tmp_file_path)
+                    paper_metadata = _process_pdf_bytes(uploaded_file.getvalue())
                     st.success("PDF processed successfully!")
                 except Exception as e:
                     st.error(f"Error processing PDF: {e}")
-                finally:
-                    os.unlink(tmp_file_path)
     
     elif input_method == "PubMed ID":
         pubmed_id = st.text_input(
@@ -171,7 +191,7 @@ def method_extraction_section():
     st.markdown('<div class="section-header">🔍 Method Extraction</div>', unsafe_allow_html=True)
     
     if st.button("Extract Computational Methods", key="extract_methods"):
-        extractor = MethodExtractor()
+        extractor = get_method_extractor()
         
         with st.spinner("Analyzing paper with Claude AI..."):
             try:
@@ -249,15 +269,40 @@ def code_generation_section():
     )
     
     if st.button("Generate Code", key="generate_code"):
-        generator = CodeGenerator()
+        generator = get_code_generator()
+        
+        # Show each category's response as it streams in; the live view is
+        # cleared once the parsed scripts are available below
+        live_output = st.empty()
+        streamed_text = {}
+        placeholders = {}
+        last_render = {}
+        
+        def render_stream(category):
+            placeholders[category].code("".join(streamed_text[category]), language=language)
+            last_render[category] = time.monotonic()
+        
+        def show_stream(category, text):
+            if category not in placeholders:
+                placeholders[category] = st.empty()
+                streamed_text[category] = []
+                last_render[category] = 0.0
+            streamed_text[category].append(text)
+            if time.monotonic() - last_render[category] >= STREAM_RENDER_INTERVAL:
+                render_stream(category)
         
         with st.spinner("Generating reproducible code..."):
             try:
-                generated_scripts = generator.generate_code_from_methods(
-                    st.session_state.extracted_methods,
-                    st.session_state.paper_metadata.title,
-                    language
-                )
+                with live_output.container():
+                    generated_scripts = generator.generate_code_from_methods(
+                        st.session_state.extracted_methods,
+                        st.session_state.paper_metadata.title,
+                        language,
+                        on_text=show_stream
+                    )
+                    for category in placeholders:
+                        render_stream(category)
+                live_output.empty()
                 st.session_state.generated_code = generated_scripts
                 st.session_state.current_step = 4
                 st.success(f"Generated {len(generated_scripts)} code scripts!")
@@ -299,12 +344,19 @@ def qa_interface_section():
     
     st.markdown('<div class="section-header">❓ Interactive Q&A</div>', unsafe_allow_html=True)
     
-    # Load paper context into QA interface
-    if st.session_state.paper_metadata and st.session_state.extracted_methods:
+    # Load paper context into QA interface, only when the paper or the
+    # extracted methods have changed since the last rerun. The cached PDF
+    # result is a fresh copy on every rerun, so the key is taken from content
+    ctx_key = content_key(
+        st.session_state.paper_metadata.full_text,
+        orjson.dumps(st.session_state.extracted_methods).decode()
+    )
+    if st.session_state.get('_qa_ctx_key') != ctx_key:
         st.session_state.qa_interface.load_paper_context(
             st.session_state.paper_metadata,
             st.session_state.extracted_methods
         )
+        st.session_state._qa_ctx_key = ctx_key
     
     # Suggested questions
     with st.expander("💡 Suggested Questions"):
@@ -346,12 +398,10 @@ def qa_interface_section():
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"biolit_conversation_{timestamp}.json"
             
-            # Create temporary file for download
-            import tempfile
-            with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as tmp_file:
-                st.session_state.qa_interface.export_conversation(tmp_file.name)
-                with open(tmp_file.name, 'r') as f:
-                    conversation_data = f.read()
+            conversation_data = orjson.dumps(
+                st.session_state.qa_interface.to_dict(),
+                option=orjson.OPT_INDENT_2
+            )
             
             st.download_button(
                 label="Download Conversation",
@@ -396,7 +446,7 @@ def sidebar():
         
         # Clear session
         if st.button("🔄 Reset Session"):
-            for key in ['paper_metadata', 'extracted_methods', 'generated_code']:
+            for key in ['paper_metadata', 'extracted_methods', 'generated_code', '_qa_ctx_key']:
                 if key in st.session_state:
                     del st.session_state[key]
             st.session_state.qa_interface = InteractiveQA()
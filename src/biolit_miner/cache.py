@@ -0,0 +1,171 @@
+import os
+import re
+import time
+import shelve
+import sqlite3
+import hashlib
+import functools
+import threading
+from contextlib import closing
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+CACHE_DIR = os.getenv('BIOLIT_CACHE_DIR', '.biolit_cache')
+
+# shelve is not safe for concurrent writers, and Streamlit serves sessions
+# from multiple threads, so every access goes through one lock
+_lock = threading.Lock()
+
+def content_key(*parts: str) -> str:
+    # Keys only need to fingerprint content, not resist attacks, so the
+    # memory-bandwidth-bound xxh3 is used when installed; blake2b is the
+    # stdlib fallback and still quicker than sha256. Each part is prefixed with
+    # its length so different splits of the same text get different keys
+    data = "".join(f"{len(part)}:{part}" for part in parts).encode('utf-8')
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(data)
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+class DiskCache:
+    def __init__(self, name: str, cache_dir: str = CACHE_DIR, expire: Optional[float] = None):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, name)
+        # Entries older than expire seconds are treated as misses; with an
+        # expiry set, values are stored alongside their deadline
+        self.expire = expire
+
+    def get(self, key: str) -> Optional[Any]:
+        # A missing or unreadable cache is treated as a miss, never an error
+        try:
+            with _lock, shelve.open(self.path, flag='r') as db:
+                value = db.get(key)
+        except Exception:
+            return None
+
+        if self.expire is None or value is None:
+            return value
+        expires_at, value = value
+        return value if time.time() < expires_at else None
+
+    def set(self, key: str, value: Any):
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, Any]):
+        # All entries are written under one open so a batch lands together
+        if self.expire is not None:
+            expires_at = time.time() + self.expire
+            items = {key: (expires_at, value) for key, value in items.items()}
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with _lock, shelve.open(self.path) as db:
+                db.update(items)
+        except Exception as e:
+            print(f"Failed to write cache entry to {self.path}: {e}")
+
+@functools.lru_cache(maxsize=1)
+def _load_sentence_model():
+    # sentence-transformers pulls in torch, so it is optional; without it only
+    # exact repeats of a question are served from the cache
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        return None
+    return SentenceTransformer('all-MiniLM-L6-v2')
+
+def _normalize_question(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+class SemanticCache:
+    def __init__(self, name: str = 'qa_semantic.sqlite', cache_dir: str = CACHE_DIR,
+                 threshold: float = 0.92):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, name)
+        self.threshold = threshold
+        self._entries: Dict[str, Tuple[Dict[str, str], np.ndarray, List[str]]] = {}
+
+    @property
+    def model_name(self) -> str:
+        return 'all-MiniLM-L6-v2' if _load_sentence_model() is not None else 'exact'
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        model = _load_sentence_model()
+        if model is None:
+            return None
+        vector = np.asarray(model.encode(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, question: str, scope: str,
+               embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        # embedding, when given, is the question's embed() result, so a miss
+        # followed by add() only encodes the question once
+        exact, embeddings, answers = self._load_scope(scope)
+        answer = exact.get(_normalize_question(question))
+        if answer is not None or not answers:
+            return answer
+
+        # Paraphrases are only matched with a real sentence-embedding model
+        if embedding is None:
+            embedding = self.embed(question)
+        similarities = embeddings @ embedding
+        best = int(np.argmax(similarities))
+        return answers[best] if similarities[best] > self.threshold else None
+
+    def add(self, question: str, answer: str, scope: str,
+            embedding: Optional[np.ndarray] = None):
+        if embedding is None:
+            embedding = self.embed(question)
+        exact, embeddings, answers = self._load_scope(scope)
+        exact[_normalize_question(question)] = answer
+        if embedding is not None:
+            matrix = np.vstack([embeddings, embedding]) if answers else embedding[np.newaxis]
+            self._entries[scope] = (exact, matrix, answers + [answer])
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with _lock, closing(sqlite3.connect(self.path)) as conn, conn:
+                self._ensure_table(conn)
+                conn.execute(
+                    "INSERT INTO qa_cache (scope, model, question, answer, embedding) VALUES (?, ?, ?, ?, ?)",
+                    (scope, self.model_name, question, answer,
+                     embedding.tobytes() if embedding is not None else None)
+                )
+        except Exception as e:
+            print(f"Failed to write semantic cache entry to {self.path}: {e}")
+
+    def _load_scope(self, scope: str) -> Tuple[Dict[str, str], np.ndarray, List[str]]:
+        # Entries for a paper are read from SQLite once and then kept in memory:
+        # exact answers by normalized question, and with an embedding model a
+        # normalized matrix so each lookup is a single matrix-vector product
+        if scope not in self._entries:
+            exact, embeddings, answers = {}, [], []
+            model_name = self.model_name
+            try:
+                with _lock, closing(sqlite3.connect(self.path)) as conn:
+                    self._ensure_table(conn)
+                    rows = conn.execute(
+                        "SELECT model, question, answer, embedding FROM qa_cache WHERE scope = ?",
+                        (scope,)
+                    ).fetchall()
+                for model, question, answer, blob in rows:
+                    exact[_normalize_question(question)] = answer
+                    if model == model_name and blob:
+                        answers.append(answer)
+                        embeddings.append(np.frombuffer(blob, dtype=np.float32))
+            except Exception:
+                exact, embeddings, answers = {}, [], []
+
+            matrix = np.vstack(embeddings) if embeddings else np.empty((0, 0), dtype=np.float32)
+            self._entries[scope] = (exact, matrix, answers)
+        return self._entries[scope]
+
+    def _ensure_table(self, conn: sqlite3.Connection):
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS qa_cache "
+            "(scope TEXT, model TEXT, question TEXT, answer TEXT, embedding BLOB)"
+        )
@@ -1,12 +1,63 @@
 import os
 import re
-from typing import Dict, List, Optional
+import functools
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from anthropic import Anthropic
-from dotenv import load_dotenv
-from .method_extractor import ExtractedMethods, ComputationalMethod
+from .methods import ExtractedMethods, ComputationalMethod
+from .llm_client import get_shared_async_client
+from .cache import DiskCache, content_key
 
-load_dotenv()
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+
+# anthropic pulls in httpx and pydantic, so it is imported when a generator
+# is first built rather than when the module is loaded
+@functools.lru_cache(maxsize=1)
+def _ensure_env():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+@functools.lru_cache(maxsize=None)
+def _marker_pattern(marker: str) -> "re.Pattern":
+    # The markers are a handful of fixed headers and fences, so each pattern
+    # is compiled once
+    return re.compile(re.escape(marker), re.IGNORECASE)
+
+def _find_marker(text: str, marker: str, start: int = 0) -> int:
+    # Claude normally echoes the section headers exactly as requested, so a
+    # plain find covers almost every response; the regex only runs for
+    # differently-cased headers.
+    index = text.find(marker, start)
+    if index == -1:
+        match = _marker_pattern(marker).search(text, start)
+        if match:
+            index = match.start()
+    return index
+
+def _read_template(entry: os.DirEntry) -> Tuple[str, str]:
+    with open(entry.path, 'r') as f:
+        return entry.name[:-3], f.read()  # Remove .py extension
+
+@functools.lru_cache(maxsize=1)
+def _load_templates_cached(templates_dir: str) -> Dict[str, str]:
+    # Templates ship with the package and never change at runtime, so the
+    # directory is only read once per process
+    if not os.path.exists(templates_dir):
+        return {}
+    
+    with os.scandir(templates_dir) as it:
+        entries = [entry for entry in it if entry.name.endswith('.py') and entry.is_file()]
+    
+    if not entries:
+        return {}
+    
+    # Overlap the open/read calls, which dominate on slow or network drives
+    with ThreadPoolExecutor(max_workers=min(4, len(entries))) as executor:
+        return dict(executor.map(_read_template, entries))
 
 @dataclass
 class GeneratedCode:
@@ -18,76 +69,151 @@ class GeneratedCode:
 
 class CodeGenerator:
     def __init__(self):
+        _ensure_env()
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
-        self.client = Anthropic(api_key=api_key)
+        self.api_key = api_key
         
         # Load code templates
         self.templates_dir = os.path.join(os.path.dirname(__file__), 'templates')
-        self.templates = self._load_templates()
-    
-    def _load_templates(self) -> Dict[str, str]:
-        templates = {}
-        if os.path.exists(self.templates_dir):
-            for filename in os.listdir(self.templates_dir):
-                if filename.endswith('.py'):
-                    template_name = filename[:-3]  # Remove .py extension
-                    template_path = os.path.join(self.templates_dir, filename)
-                    with open(template_path, 'r') as f:
-                        templates[template_name] = f.read()
-        return templates
+        self.templates = _load_templates_cached(self.templates_dir)
+        
+        # Generated scripts persist across sessions, keyed by the full request;
+        # the in-memory memo short-circuits repeats within this process
+        self.cache = DiskCache('generated_code')
+        self._prompt_memo: Dict[str, GeneratedCode] = {}
     
     def generate_code_from_methods(self, extracted_methods: ExtractedMethods, 
                                  paper_title: str = "", 
-                                 preferred_language: str = "python") -> List[GeneratedCode]:
+                                 preferred_language: str = "python",
+                                 on_text: Optional[Callable[[str, str], None]] = None) -> List[GeneratedCode]:
         generated_scripts = []
         
-        # Group methods by category
+        # Group methods by the template they map to, so categories sharing a
+        # template (e.g. data_analysis and statistical_analysis) are generated
+        # in one call; each method keeps its own category label in the prompt
         methods_by_category = {}
         for method in extracted_methods.computational_methods:
-            category = method.category
+            category = self._category_to_template(method.category)
             if category not in methods_by_category:
                 methods_by_category[category] = []
             methods_by_category[category].append(method)
         
-        # Generate code for each category
-        for category, methods in methods_by_category.items():
-            script = self._generate_category_script(
-                category, methods, extracted_methods, paper_title, preferred_language
-            )
-            if script:
-                generated_scripts.append(script)
+        if not methods_by_category:
+            return generated_scripts
         
-        return generated_scripts
-    
-    def _generate_category_script(self, category: str, methods: List[ComputationalMethod],
-                                extracted_methods: ExtractedMethods, paper_title: str,
-                                language: str) -> Optional[GeneratedCode]:
+        run = functools.partial(asyncio.run, self._agenerate_all_categories(
+            methods_by_category, extracted_methods, paper_title, preferred_language, on_text
+        ))
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            scripts = run()
+        else:
+            # asyncio.run cannot nest inside a running loop (Jupyter, async
+            # callers), so the generation gets its own loop on a worker thread
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                scripts = executor.submit(run).result()
         
-        # Get appropriate template
-        template = self._get_template_for_category(category)
+        return [script for script in scripts if script]
+    
+    async def _agenerate_all_categories(self, methods_by_category: Dict[str, List[ComputationalMethod]],
+                                      extracted_methods: ExtractedMethods, paper_title: str,
+                                      language: str,
+                                      on_text: Optional[Callable[[str, str], None]] = None) -> List[Optional[GeneratedCode]]:
+        aclient = get_shared_async_client(self.api_key)
         
-        # Create detailed prompt for code generation
-        prompt = self._create_code_generation_prompt(
-            category, methods, extracted_methods, paper_title, language, template
+        return await asyncio.gather(*[
+            self._agenerate_category_script(
+                aclient, category, methods, extracted_methods, paper_title, language, on_text
+            )
+            for category, methods in methods_by_category.items()
+        ])
+    
+    async def _agenerate_category_script(self, aclient: "AsyncAnthropic", category: str,
+                                       methods: List[ComputationalMethod],
+                                       extracted_methods: ExtractedMethods, paper_title: str,
+                                       language: str,
+                                       on_text: Optional[Callable[[str, str], None]] = None) -> Optional[GeneratedCode]:
+        request = self._create_code_generation_request(
+            category, methods, extracted_methods, paper_title, language
         )
         
+        cache_key = self._request_cache_key(request)
+        cached = self._get_cached_script(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4000,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            chunks = []
+            async with aclient.messages.stream(**request) as stream:
+                async for text in stream.text_stream:
+                    chunks.append(text)
+                    if on_text:
+                        on_text(category, text)
+                final_message = await stream.get_final_message()
             
-            result_text = response.content[0].text
-            return self._parse_code_generation_result(result_text, category, language)
+            result_text = "".join(chunks)
+            script = self._parse_code_generation_result(result_text, category, language)
+            # Only complete responses are cached; a script cut off at
+            # max_tokens would otherwise be served for every later request
+            if final_message.stop_reason == "end_turn":
+                self._store_cached_script(cache_key, script)
+            else:
+                print(f"Code for category {category} stopped early ({final_message.stop_reason}); not caching it")
+            return script
             
         except Exception as e:
             print(f"Failed to generate code for category {category}: {e}")
             return None
     
+    def _create_code_generation_request(self, category: str, methods: List[ComputationalMethod],
+                                      extracted_methods: ExtractedMethods, paper_title: str,
+                                      language: str) -> Dict:
+        
+        # Get appropriate template
+        template = self._get_template_for_category(category)
+        
+        # Create detailed prompt for code generation
+        static_prefix, template_block, dynamic_suffix = self._create_code_generation_prompt(
+            category, methods, extracted_methods, paper_title, language, template
+        )
+        
+        return {
+            "model": "claude-3-sonnet-20240229",
+            "max_tokens": 4000,
+            "system": [
+                {"type": "text", "text": static_prefix},
+                {"type": "text", "text": template_block}
+            ],
+            "messages": [{"role": "user", "content": dynamic_suffix}]
+        }
+    
+    def _request_cache_key(self, request: Dict) -> str:
+        return content_key(
+            request["model"],
+            str(request["max_tokens"]),
+            *[block["text"] for block in request["system"]],
+            *[message["content"] for message in request["messages"]]
+        )
+    
+    def _get_cached_script(self, cache_key: str) -> Optional[GeneratedCode]:
+        script = self._prompt_memo.get(cache_key)
+        if script is None:
+            script = self.cache.get(cache_key)
+            if script is not None:
+                self._prompt_memo[cache_key] = script
+        return script
+    
+    def _store_cached_script(self, cache_key: str, script: GeneratedCode):
+        self._prompt_memo[cache_key] = script
+        self.cache.set(cache_key, script)
+    
     def _get_template_for_category(self, category: str) -> str:
+        return self.templates.get(self._category_to_template(category), "")
+    
+    def _category_to_template(self, category: str) -> str:
         category_mapping = {
             'statistical_analysis': 'statistical_analysis',
             'machine_learning': 'machine_learning',
@@ -96,54 +222,51 @@ class CodeGenerator:
             'image_analysis': 'statistical_analysis'  # Default fallback
         }
         
-        template_name = category_mapping.get(category, 'statistical_analysis')
-        return self.templates.get(template_name, "")
+        return category_mapping.get(category, 'statistical_analysis')
     
     def _create_code_generation_prompt(self, category: str, methods: List[ComputationalMethod],
                                      extracted_methods: ExtractedMethods, paper_title: str,
-                                     language: str, template: str) -> str:
+                                     language: str, template: str) -> Tuple[str, str, str]:
         
-        methods_text = "\n".join([
-            f"- {method.name}: {method.description}\n"
-            f"  Tools: {', '.join(method.software_tools)}\n"
-            f"  Parameters: {method.parameters}\n"
-            for method in methods
-        ])
+        parts = []
+        append = parts.append
+        for method in methods:
+            append(f"- {method.name}: {method.description}")
+            append(f"  Category: {method.category}")
+            append(f"  Tools: {', '.join(method.software_tools)}")
+            append(f"  Parameters: {method.parameters}")
+            append("")
+        methods_text = "\n".join(parts)
         
         datasets_text = "\n".join([
             f"- {dataset.name}: {dataset.description} (Format: {dataset.format})"
             for dataset in extracted_methods.datasets
         ])
         
-        workflows_text = "\n".join([
-            f"- {workflow.name}:\n" + 
-            "\n".join([f"  {i+1}. {step}" for i, step in enumerate(workflow.steps)])
-            for workflow in extracted_methods.workflows
-        ])
+        parts = []
+        append = parts.append
+        for workflow in extracted_methods.workflows:
+            append(f"- {workflow.name}:")
+            for i, step in enumerate(workflow.steps):
+                append(f"  {i+1}. {step}")
+        workflows_text = "\n".join(parts)
         
-        return f"""
+        # Everything here is shared by all categories of a paper
+        static_prefix = f"""
 Generate a complete {language} script that reproduces the computational analysis from this research paper.
 
 Paper Title: {paper_title}
 
-Category: {category}
-
-Methods to implement:
-{methods_text}
-
 Available Datasets:
 {datasets_text}
 
 Analysis Workflows:
 {workflows_text}
 
-Template (modify and extend as needed):
-{template}
-
 Requirements:
 1. Create a complete, runnable script in {language}
 2. Include all necessary imports and dependencies
-3. Implement the specific methods mentioned above
+3. Implement the specific methods listed in the request
 4. Add data loading functions that work with the specified dataset formats
 5. Include proper error handling and logging
 6. Add visualization functions where appropriate
@@ -168,36 +291,69 @@ USAGE:
 [INSTRUCTIONS ON HOW TO RUN THE SCRIPT]
 
 Focus on creating production-ready code that closely follows the methodology described in the paper.
+Be concise; prefer compact code.
+"""
+        
+        template_block = f"""
+Template (modify and extend as needed):
+{template}
 """
+        
+        dynamic_suffix = f"""
+Category: {category}
+
+Methods to implement:
+{methods_text}
+"""
+        
+        return static_prefix, template_block, dynamic_suffix
 
     def _parse_code_generation_result(self, result_text: str, category: str, language: str) -> GeneratedCode:
         # Extract code block
-        code_pattern = f"```{language}(.*?)```"
-        code_match = re.search(code_pattern, result_text, re.DOTALL | re.IGNORECASE)
+        script_content = None
+        fence = f"```{language}"
+        code_start = _find_marker(result_text, fence)
+        if code_start != -1:
+            code_start += len(fence)
+            code_end = result_text.find("```", code_start)
+            if code_end != -1:
+                script_content = result_text[code_start:code_end].strip()
         
-        if not code_match:
+        if script_content is None:
             # Try generic code block
-            code_match = re.search(r"```(.*?)```", result_text, re.DOTALL)
+            code_start = result_text.find("```")
+            code_end = result_text.find("```", code_start + 3) if code_start != -1 else -1
+            if code_end != -1:
+                script_content = result_text[code_start + 3:code_end].strip()
+            else:
+                script_content = result_text
         
-        script_content = code_match.group(1).strip() if code_match else result_text
+        # Locate each section header once and slice up to the next one
+        i_deps = _find_marker(result_text, "DEPENDENCIES:")
+        i_desc = _find_marker(result_text, "DESCRIPTION:")
+        i_usage = _find_marker(result_text, "USAGE:")
         
         # Extract dependencies
-        deps_pattern = r"DEPENDENCIES:\s*(.*?)(?=DESCRIPTION:|$)"
-        deps_match = re.search(deps_pattern, result_text, re.DOTALL | re.IGNORECASE)
         dependencies = []
-        if deps_match:
-            deps_text = deps_match.group(1).strip()
+        if i_deps != -1:
+            deps_start = i_deps + len("DEPENDENCIES:")
+            deps_end = _find_marker(result_text, "DESCRIPTION:", deps_start)
+            deps_text = result_text[deps_start:deps_end if deps_end != -1 else None].strip()
             dependencies = [dep.strip() for dep in deps_text.split('\n') if dep.strip()]
         
         # Extract description
-        desc_pattern = r"DESCRIPTION:\s*(.*?)(?=USAGE:|$)"
-        desc_match = re.search(desc_pattern, result_text, re.DOTALL | re.IGNORECASE)
-        description = desc_match.group(1).strip() if desc_match else f"Generated {category} analysis script"
+        if i_desc != -1:
+            desc_start = i_desc + len("DESCRIPTION:")
+            desc_end = _find_marker(result_text, "USAGE:", desc_start)
+            description = result_text[desc_start:desc_end if desc_end != -1 else None].strip()
+        else:
+            description = f"Generated {category} analysis script"
         
         # Extract usage instructions
-        usage_pattern = r"USAGE:\s*(.*?)$"
-        usage_match = re.search(usage_pattern, result_text, re.DOTALL | re.IGNORECASE)
-        usage_instructions = usage_match.group(1).strip() if usage_match else "Run the script with your data files"
+        if i_usage != -1:
+            usage_instructions = result_text[i_usage + len("USAGE:"):].strip()
+        else:
+            usage_instructions = "Run the script with your data files"
         
         return GeneratedCode(
             script_content=script_content,
@@ -213,28 +369,27 @@ Focus on creating production-ready code that closely follows the methodology des
         
         # Save script
         script_path = os.path.join(output_dir, f"{filename}.py")
-        with open(script_path, 'w') as f:
-            f.write(generated_code.script_content)
+        Path(script_path).write_bytes(generated_code.script_content.encode())
         
-        # Save metadata
+        # Save metadata, built in full so it is written with a single call
         metadata_path = os.path.join(output_dir, f"{filename}_metadata.txt")
-        with open(metadata_path, 'w') as f:
-            f.write(f"Description: {generated_code.description}\n\n")
-            f.write(f"Dependencies:\n")
-            for dep in generated_code.dependencies:
-                f.write(f"- {dep}\n")
-            f.write(f"\nUsage Instructions:\n{generated_code.usage_instructions}")
+        metadata_text = (
+            f"Description: {generated_code.description}\n\n"
+            f"Dependencies:\n"
+            + "".join(f"- {dep}\n" for dep in generated_code.dependencies)
+            + f"\nUsage Instructions:\n{generated_code.usage_instructions}"
+        )
+        Path(metadata_path).write_text(metadata_text)
         
         return script_path, metadata_path
     
     def generate_requirements_file(self, generated_scripts: List[GeneratedCode], 
                                  output_path: str):
-        all_deps = set()
-        for script in generated_scripts:
-            all_deps.update(script.dependencies)
+        all_deps = sorted(set(chain.from_iterable(
+            script.dependencies for script in generated_scripts
+        )))
         
         with open(output_path, 'w') as f:
-            for dep in sorted(all_deps):
-                f.write(f"{dep}\n")
+            f.write("".join(f"{dep}\n" for dep in all_deps))
         
         return output_path
\ No newline at end of file
@@ -0,0 +1,106 @@
+import asyncio
+import functools
+import threading
+import importlib.util
+import weakref
+from typing import TYPE_CHECKING, Dict, Set
+
+if TYPE_CHECKING:
+    from anthropic import Anthropic, AsyncAnthropic
+
+# One connection pool is shared by the extractor, Q&A and code generator so
+# TLS sessions opened by one are reused by the others
+POOL_MAX_CONNECTIONS = 32
+POOL_MAX_KEEPALIVE = 16
+
+# Token budget for the paper text included in extraction prompts
+MAX_CONTEXT_TOKENS = 12000
+# Q&A sends the paper with every question, so it keeps a smaller excerpt
+# (about the 8000 characters it used before)
+QA_CONTEXT_TOKENS = 2000
+
+_lock = threading.Lock()
+_clients: Dict[str, "Anthropic"] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncAnthropic]]" = weakref.WeakKeyDictionary()
+_close_tasks: Set[asyncio.Task] = set()
+
+def _http2_available() -> bool:
+    # httpx only negotiates HTTP/2 when the optional h2 package is installed
+    return importlib.util.find_spec('h2') is not None
+
+def _pool_limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_KEEPALIVE
+    )
+
+def get_shared_client(api_key: str) -> "Anthropic":
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            import httpx
+            from anthropic import Anthropic
+
+            client = Anthropic(
+                api_key=api_key,
+                http_client=httpx.Client(
+                    http2=_http2_available(),
+                    limits=_pool_limits(),
+                    follow_redirects=True
+                )
+            )
+            _clients[api_key] = client
+        return client
+
+async def _close_on_shutdown(client: "AsyncAnthropic"):
+    # Parked until the loop shuts down; asyncio.run cancels pending tasks
+    # while the loop can still run them, so the pool is closed on its own loop
+    try:
+        await asyncio.Future()
+    finally:
+        await client.close()
+
+def get_shared_async_client(api_key: str) -> "AsyncAnthropic":
+    # An async connection pool is bound to the event loop it is first used on,
+    # so each loop gets its own client, closed when that loop shuts down
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(api_key)
+        if client is None:
+            import httpx
+            from anthropic import AsyncAnthropic
+
+            client = AsyncAnthropic(
+                api_key=api_key,
+                http_client=httpx.AsyncClient(
+                    http2=_http2_available(),
+                    limits=_pool_limits(),
+                    follow_redirects=True
+                )
+            )
+            clients[api_key] = client
+            task = loop.create_task(_close_on_shutdown(client))
+            _close_tasks.add(task)
+            task.add_done_callback(_close_tasks.discard)
+        return client
+
+@functools.lru_cache(maxsize=32)
+def truncate_to_tokens(client: "Anthropic", text: str, max_tokens: int = MAX_CONTEXT_TOKENS) -> str:
+    # Memoized on the text itself, so every prompt built for the same paper
+    # reuses one tokenization. Tokens average about four characters, so a
+    # prefix four times longer than that is enough to place the cut, which is
+    # taken from the token offsets rather than found by repeated counting
+    window = text[:max_tokens * 16]
+    try:
+        encoding = client.get_tokenizer().encode(window)
+    except Exception:
+        # Fall back to the usual ~4 characters per token if the SDK's
+        # tokenizer is unavailable
+        return text[:max_tokens * 4]
+
+    if len(encoding.ids) <= max_tokens:
+        return window
+    return window[:encoding.offsets[max_tokens - 1][1]]
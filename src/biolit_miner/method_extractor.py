@@ -1,76 +1,109 @@
 import os
-import json
-from typing import Dict, List, Optional
-from dataclasses import dataclass, asdict
-from anthropic import Anthropic
+import asyncio
+import orjson
+from typing import Dict, List, Optional, Tuple
+from anthropic import AsyncAnthropic
 from dotenv import load_dotenv
+from .llm_client import get_shared_client, get_shared_async_client, truncate_to_tokens
+from .cache import DiskCache, content_key
+from .methods import ComputationalMethod, Dataset, Workflow, ExtractedMethods
 
 load_dotenv()
 
-@dataclass
-class ComputationalMethod:
-    name: str
-    description: str
-    software_tools: List[str]
-    programming_languages: List[str]
-    parameters: Dict[str, str]
-    category: str  # e.g., "statistical_analysis", "machine_learning", "bioinformatics"
-
-@dataclass
-class Dataset:
-    name: str
-    description: str
-    source: str
-    format: str
-    size: Optional[str] = None
-
-@dataclass
-class Workflow:
-    name: str
-    steps: List[str]
-    input_data: List[str]
-    output_data: List[str]
-    dependencies: List[str]
-
-@dataclass
-class ExtractedMethods:
-    computational_methods: List[ComputationalMethod]
-    datasets: List[Dataset]
-    workflows: List[Workflow]
-    key_findings: List[str]
-    reproducibility_notes: str
-
 class MethodExtractor:
     def __init__(self):
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
-        self.client = Anthropic(api_key=api_key)
+        self.api_key = api_key
+        self.client = get_shared_client(api_key)
+        
+        # Extraction results persist across sessions, keyed by a fingerprint of
+        # the prompt; the in-memory memo short-circuits repeats within this process
+        self.cache = DiskCache('extracted_methods')
+        self._memo: Dict[str, ExtractedMethods] = {}
     
     def extract_methods(self, paper_text: str, paper_title: str = "") -> ExtractedMethods:
-        prompt = self._create_extraction_prompt(paper_text, paper_title)
+        cache_key, request = self._create_extraction_request(paper_text, paper_title)
+        cached = self._get_cached_methods(cache_key)
+        if cached is not None:
+            return cached
         
         try:
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=4000,
-                messages=[{"role": "user", "content": prompt}]
-            )
+            response = self.client.messages.create(**request)
             
             result_text = response.content[0].text
-            return self._parse_extraction_result(result_text)
+            methods = self._parse_extraction_result(result_text)
+            self._store_cached_methods(cache_key, methods)
+            return methods
             
         except Exception as e:
             raise Exception(f"Failed to extract methods using Claude: {e}")
     
-    def _create_extraction_prompt(self, paper_text: str, paper_title: str = "") -> str:
-        return f"""
-Analyze the following research paper and extract computational methods, datasets, and workflows in a structured JSON format.
-
-Paper Title: {paper_title}
-
-Paper Text:
-{paper_text[:15000]}  # Limit text to avoid token limits
+    async def extract_methods_async(self, paper_text: str, paper_title: str = "") -> ExtractedMethods:
+        cache_key, request = self._create_extraction_request(paper_text, paper_title)
+        cached = self._get_cached_methods(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self._get_aclient().messages.create(**request)
+            
+            result_text = response.content[0].text
+            methods = self._parse_extraction_result(result_text)
+            self._store_cached_methods(cache_key, methods)
+            return methods
+            
+        except Exception as e:
+            raise Exception(f"Failed to extract methods using Claude: {e}")
+    
+    async def extract_methods_many(self, papers: List[Tuple[str, str]],
+                                   max_concurrency: int = 8) -> List[ExtractedMethods]:
+        # papers is a list of (paper_text, paper_title); the semaphore bounds
+        # in-flight requests to stay within rate limits
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def extract(paper_text: str, paper_title: str) -> ExtractedMethods:
+            async with semaphore:
+                return await self.extract_methods_async(paper_text, paper_title)
+        
+        return list(await asyncio.gather(*[extract(text, title) for text, title in papers]))
+    
+    def _get_cached_methods(self, cache_key: str) -> Optional[ExtractedMethods]:
+        methods = self._memo.get(cache_key)
+        if methods is None:
+            methods = self.cache.get(cache_key)
+            if methods is not None:
+                self._memo[cache_key] = methods
+        return methods
+    
+    def _store_cached_methods(self, cache_key: str, methods: ExtractedMethods):
+        self._memo[cache_key] = methods
+        self.cache.set(cache_key, methods)
+    
+    def _get_aclient(self) -> AsyncAnthropic:
+        return get_shared_async_client(self.api_key)
+    
+    def _create_extraction_request(self, paper_text: str, paper_title: str = "") -> Tuple[str, Dict]:
+        instructions, paper_block = self._create_extraction_prompt(paper_text, paper_title)
+        
+        model = "claude-3-sonnet-20240229"
+        cache_key = content_key(model, instructions, paper_block)
+        
+        request = {
+            "model": model,
+            "max_tokens": 4000,
+            "messages": [{"role": "user", "content": [
+                {"type": "text", "text": instructions},
+                {"type": "text", "text": paper_block}
+            ]}]
+        }
+        
+        return cache_key, request
+    
+    def _create_extraction_prompt(self, paper_text: str, paper_title: str = "") -> Tuple[str, str]:
+        instructions = """
+Analyze the research paper provided after these instructions and extract computational methods, datasets, and workflows in a structured JSON format.
 
 Please extract and structure the following information as a JSON object:
 
@@ -101,41 +134,50 @@ Please extract and structure the following information as a JSON object:
 5. **Reproducibility Notes**: Any notes about code availability, data sharing, or reproducibility
 
 Return your response as a valid JSON object with the following structure:
-{{
+{
   "computational_methods": [
-    {{
+    {
       "name": "string",
       "description": "string",
       "software_tools": ["string"],
       "programming_languages": ["string"],
-      "parameters": {{"param": "value"}},
+      "parameters": {"param": "value"},
       "category": "string"
-    }}
+    }
   ],
   "datasets": [
-    {{
+    {
       "name": "string",
       "description": "string",
       "source": "string",
       "format": "string",
       "size": "string"
-    }}
+    }
   ],
   "workflows": [
-    {{
+    {
       "name": "string",
       "steps": ["string"],
       "input_data": ["string"],
       "output_data": ["string"],
       "dependencies": ["string"]
-    }}
+    }
   ],
   "key_findings": ["string"],
   "reproducibility_notes": "string"
-}}
+}
 
 Focus on extracting concrete, actionable information that could be used to reproduce the computational aspects of the research.
 """
+        
+        paper_block = f"""
+Paper Title: {paper_title}
+
+Paper Text:
+{truncate_to_tokens(self.client, paper_text)}
+"""
+        
+        return instructions, paper_block
 
     def _parse_extraction_result(self, result_text: str) -> ExtractedMethods:
         try:
@@ -146,7 +188,7 @@ Focus on extracting concrete, actionable information that could be used to repro
                 raise ValueError("No JSON found in response")
             
             json_str = result_text[json_start:json_end]
-            data = json.loads(json_str)
+            data = orjson.loads(json_str)
             
             computational_methods = [
                 ComputationalMethod(**method) 
@@ -171,18 +213,20 @@ Focus on extracting concrete, actionable information that could be used to repro
                 reproducibility_notes=data.get('reproducibility_notes', '')
             )
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             raise Exception(f"Failed to parse JSON response: {e}")
         except Exception as e:
             raise Exception(f"Failed to parse extraction result: {e}")
     
     def save_extracted_methods(self, methods: ExtractedMethods, output_path: str):
-        with open(output_path, 'w') as f:
-            json.dump(asdict(methods), f, indent=2)
+        # orjson serializes the nested dataclasses directly, without the deep
+        # copy asdict() makes
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(methods, option=orjson.OPT_INDENT_2))
     
     def load_extracted_methods(self, input_path: str) -> ExtractedMethods:
-        with open(input_path, 'r') as f:
-            data = json.load(f)
+        with open(input_path, 'rb') as f:
+            data = orjson.loads(f.read())
         
         return ExtractedMethods(
             computational_methods=[
@@ -0,0 +1,35 @@
+from typing import Dict, List, Optional
+from dataclasses import dataclass
+
+@dataclass
+class ComputationalMethod:
+    name: str
+    description: str
+    software_tools: List[str]
+    programming_languages: List[str]
+    parameters: Dict[str, str]
+    category: str  # e.g., "statistical_analysis", "machine_learning", "bioinformatics"
+
+@dataclass
+class Dataset:
+    name: str
+    description: str
+    source: str
+    format: str
+    size: Optional[str] = None
+
+@dataclass
+class Workflow:
+    name: str
+    steps: List[str]
+    input_data: List[str]
+    output_data: List[str]
+    dependencies: List[str]
+
+@dataclass
+class ExtractedMethods:
+    computational_methods: List[ComputationalMethod]
+    datasets: List[Dataset]
+    workflows: List[Workflow]
+    key_findings: List[str]
+    reproducibility_notes: str
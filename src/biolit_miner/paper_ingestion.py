@@ -1,11 +1,62 @@
+import io
 import os
 import requests
+from requests.adapters import HTTPAdapter
 import PyPDF2
 import pdfplumber
-from typing import Dict, List, Optional, Tuple
+import fitz
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass
 import re
-import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree
+from .cache import DiskCache
+
+# Papers up to this length are extracted in-process; starting worker
+# processes costs more than it saves on short documents
+SERIAL_PAGE_LIMIT = 10
+MAX_PAGES_PER_WORKER_TASK = 50
+
+# Downstream prompts only use the start of a paper (MAX_CONTEXT_TOKENS of it,
+# at roughly four characters per token), so the app stops extracting pages once
+# this many characters have been collected
+PROMPT_TEXT_BUDGET = 64000
+
+# A paper's own DOI is printed in its header; matches further into the text are
+# almost always citations in the reference list, so only the start is scanned
+DOI_SCAN_CHARS = 8192
+_DOI_RE = re.compile(r'doi:?\s*(10\.\d+/[^\s]+)', re.IGNORECASE)
+_LEADING_WS_RE = re.compile(r'\s*')
+_TITLE_RE = re.compile(r'[^\n]{10,200}')
+
+# PubMed records rarely change once published, so lookups are kept for 30 days
+PUBMED_CACHE_EXPIRE = 30 * 24 * 3600
+
+def _open_pdf_source(source: Union[str, bytes]):
+    # Both parsers read from file-like objects, so in-memory uploads never
+    # need to be written to disk first
+    return io.BytesIO(source) if isinstance(source, bytes) else open(source, 'rb')
+
+def _extract_page_range(source: Union[str, bytes], start: int, stop: int) -> List[Optional[str]]:
+    with _open_pdf_source(source) as file, pdfplumber.open(file) as pdf:
+        return [pdf.pages[i].extract_text() for i in range(start, stop)]
+
+# PubMed XPaths are compiled once at import instead of walking the tree with
+# ElementTree's pure-Python find() on every request
+_XML_PARSER = etree.XMLParser(resolve_entities=False)
+_ARTICLE_XP = etree.XPath('.//Article')
+_PMID_XP = etree.XPath('./MedlineCitation/PMID/text()')
+_TITLE_XP = etree.XPath('.//ArticleTitle/text()')
+_ABSTRACT_XP = etree.XPath('.//Abstract/AbstractText/text()')
+_AUTHOR_XP = etree.XPath('.//AuthorList/Author')
+_JOURNAL_XP = etree.XPath('.//Journal/Title/text()')
+_YEAR_XP = etree.XPath('.//PubDate/Year/text()')
+_DOI_XP = etree.XPath('.//ELocationID[@EIdType="doi"]/text()')
+_ID_XP = etree.XPath('.//Id/text()')
+
+def _first_text(xpath: etree.XPath, element: etree._Element) -> str:
+    result = xpath(element)
+    return str(result[0]) if result else ""
 
 @dataclass
 class PaperMetadata:
@@ -21,18 +72,68 @@ class PaperMetadata:
 class PaperIngestionEngine:
     def __init__(self):
         self.pubmed_base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+        
+        # Reuse TCP/TLS connections to NCBI across requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        self.pubmed_cache = DiskCache('pubmed', expire=PUBMED_CACHE_EXPIRE)
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
+        return self._extract_text(pdf_path)
+    
+    def extract_text_from_pdf_bytes(self, data: bytes) -> str:
+        return self._extract_text(data)
+    
+    def iter_pages_text(self, source: Union[str, bytes]) -> Iterator[Tuple[int, str]]:
+        # Pages are loaded one at a time, so callers that stop early never
+        # pay to parse the rest of the document
+        with self._open_pymupdf(source) as doc:
+            for page_no, page in enumerate(doc):
+                yield page_no, page.get_text("text")
+    
+    def extract_text_up_to(self, source: Union[str, bytes], max_chars: int = PROMPT_TEXT_BUDGET) -> str:
+        try:
+            parts = []
+            total = 0
+            for _, page_text in self.iter_pages_text(source):
+                parts.append(page_text)
+                total += len(page_text) + 1
+                if total >= max_chars:
+                    break
+            return "\n".join(parts).strip()[:max_chars]
+        except Exception:
+            # Fall back to the full extraction path for files MuPDF rejects
+            return self._extract_text(source)[:max_chars]
+    
+    def _extract_text(self, source: Union[str, bytes]) -> str:
+        # PyMuPDF's C layout engine is much faster than the pure-Python
+        # parsers, which are only used for files MuPDF cannot open
+        try:
+            return self._extract_text_pymupdf(source)
+        except Exception:
+            pass
+        
         text = ""
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
+            with _open_pdf_source(source) as file, pdfplumber.open(file) as pdf:
+                page_count = len(pdf.pages)
+                if page_count <= SERIAL_PAGE_LIMIT:
+                    page_texts = [page.extract_text() for page in pdf.pages]
+            
+            # Page layout analysis is CPU-bound, so longer papers are split
+            # into page ranges and extracted in worker processes
+            if page_count > SERIAL_PAGE_LIMIT:
+                page_texts = self._extract_pages_parallel(source, page_count)
+            
+            for page_text in page_texts:
+                if page_text:
+                    text += page_text + "\n"
         except Exception as e:
             try:
-                with open(pdf_path, 'rb') as file:
+                with _open_pdf_source(source) as file:
                     pdf_reader = PyPDF2.PdfReader(file)
                     for page in pdf_reader.pages:
                         text += page.extract_text() + "\n"
@@ -40,7 +141,40 @@ class PaperIngestionEngine:
                 raise Exception(f"Failed to extract text from PDF: {e2}")
         return text.strip()
     
+    def _extract_text_pymupdf(self, source: Union[str, bytes]) -> str:
+        with self._open_pymupdf(source) as doc:
+            return "\n".join(page.get_text("text") for page in doc).strip()
+    
+    def _open_pymupdf(self, source: Union[str, bytes]) -> "fitz.Document":
+        if isinstance(source, bytes):
+            doc = fitz.open(stream=source, filetype="pdf")
+        else:
+            doc = fitz.open(source)
+        
+        if doc.needs_pass:
+            doc.close()
+            raise ValueError("PDF is encrypted")
+        return doc
+    
+    def _extract_pages_parallel(self, source: Union[str, bytes], page_count: int) -> List[Optional[str]]:
+        workers = os.cpu_count() or 1
+        # Large documents use smaller ranges so no worker holds too many
+        # parsed pages at once
+        chunk_size = min(-(-page_count // workers), MAX_PAGES_PER_WORKER_TASK)
+        starts = range(0, page_count, chunk_size)
+        stops = [min(start + chunk_size, page_count) for start in starts]
+        
+        page_texts = []
+        with ProcessPoolExecutor(max_workers=min(workers, len(starts))) as executor:
+            for chunk in executor.map(_extract_page_range, [source] * len(starts), starts, stops):
+                page_texts.extend(chunk)
+        return page_texts
+    
     def fetch_pubmed_metadata(self, pubmed_id: str) -> Dict:
+        cached = self.pubmed_cache.get(f"efetch:{pubmed_id}")
+        if cached is not None:
+            return cached
+        
         try:
             url = f"{self.pubmed_base_url}efetch.fcgi"
             params = {
@@ -48,52 +182,90 @@ class PaperIngestionEngine:
                 'id': pubmed_id,
                 'retmode': 'xml'
             }
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params)
             response.raise_for_status()
             
-            root = ET.fromstring(response.content)
-            article = root.find('.//Article')
+            root = etree.fromstring(response.content, parser=_XML_PARSER)
+            articles = _ARTICLE_XP(root)
             
-            if article is None:
+            if not articles:
                 raise Exception("Article not found in PubMed response")
             
-            title = article.find('.//ArticleTitle').text if article.find('.//ArticleTitle') is not None else ""
-            abstract_elem = article.find('.//Abstract/AbstractText')
-            abstract = abstract_elem.text if abstract_elem is not None else ""
-            
-            authors = []
-            author_list = article.find('.//AuthorList')
-            if author_list:
-                for author in author_list.findall('.//Author'):
-                    last_name = author.find('.//LastName')
-                    first_name = author.find('.//ForeName')
-                    if last_name is not None:
-                        name = last_name.text
-                        if first_name is not None:
-                            name = f"{first_name.text} {name}"
-                        authors.append(name)
-            
-            journal_elem = article.find('.//Journal/Title')
-            journal = journal_elem.text if journal_elem is not None else ""
-            
-            year_elem = article.find('.//PubDate/Year')
-            year = year_elem.text if year_elem is not None else ""
-            
-            doi_elem = article.find('.//ELocationID[@EIdType="doi"]')
-            doi = doi_elem.text if doi_elem is not None else ""
-            
-            return {
-                'title': title,
-                'authors': authors,
-                'abstract': abstract,
-                'journal': journal,
-                'year': year,
-                'doi': doi
+            metadata = self._parse_article(articles[0])
+            self.pubmed_cache.set(f"efetch:{pubmed_id}", metadata)
+            return metadata
+        except Exception as e:
+            raise Exception(f"Failed to fetch PubMed metadata: {e}")
+    
+    def fetch_pubmed_metadata_bulk(self, pubmed_ids: List[str]) -> Dict[str, Dict]:
+        results = {}
+        missing = []
+        for pubmed_id in pubmed_ids:
+            cached = self.pubmed_cache.get(f"efetch:{pubmed_id}")
+            if cached is not None:
+                results[pubmed_id] = cached
+            else:
+                missing.append(pubmed_id)
+        if not missing:
+            return results
+        
+        # One efetch request for the remaining batch instead of one per paper;
+        # POST keeps long ID lists out of the URL
+        try:
+            url = f"{self.pubmed_base_url}efetch.fcgi"
+            data = {
+                'db': 'pubmed',
+                'id': ",".join(missing),
+                'retmode': 'xml'
             }
+            with self.session.post(url, data=data, stream=True) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                
+                # Parse articles as they stream in and free each one once read,
+                # so memory stays flat regardless of batch size
+                fetched = {}
+                for _, pubmed_article in etree.iterparse(response.raw, tag='PubmedArticle',
+                                                         resolve_entities=False):
+                    pmid = _PMID_XP(pubmed_article)
+                    articles = _ARTICLE_XP(pubmed_article)
+                    if pmid and articles:
+                        fetched[pmid[0]] = self._parse_article(articles[0])
+                
+                    pubmed_article.clear()
+                    while pubmed_article.getprevious() is not None:
+                        del pubmed_article.getparent()[0]
+            
+            self.pubmed_cache.set_many({f"efetch:{pmid}": metadata for pmid, metadata in fetched.items()})
+            results.update(fetched)
+            return results
         except Exception as e:
             raise Exception(f"Failed to fetch PubMed metadata: {e}")
     
+    def _parse_article(self, article: etree._Element) -> Dict:
+        authors = []
+        for author in _AUTHOR_XP(article):
+            # LastName and ForeName are direct children of Author, so a child
+            # lookup avoids a descendant scan per field
+            last_name = author.findtext('LastName')
+            first_name = author.findtext('ForeName')
+            if last_name is not None:
+                authors.append(f"{first_name} {last_name}" if first_name is not None else last_name)
+        
+        return {
+            'title': _first_text(_TITLE_XP, article),
+            'authors': authors,
+            'abstract': _first_text(_ABSTRACT_XP, article),
+            'journal': _first_text(_JOURNAL_XP, article),
+            'year': _first_text(_YEAR_XP, article),
+            'doi': _first_text(_DOI_XP, article)
+        }
+    
     def search_pubmed_by_doi(self, doi: str) -> str:
+        cached = self.pubmed_cache.get(f"esearch:{doi}")
+        if cached is not None:
+            return cached
+        
         try:
             url = f"{self.pubmed_base_url}esearch.fcgi"
             params = {
@@ -101,22 +273,34 @@ class PaperIngestionEngine:
                 'term': f'"{doi}"[DOI]',
                 'retmode': 'xml'
             }
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=params)
             response.raise_for_status()
             
-            root = ET.fromstring(response.content)
-            id_elem = root.find('.//Id')
-            if id_elem is not None:
-                return id_elem.text
+            root = etree.fromstring(response.content, parser=_XML_PARSER)
+            ids = _ID_XP(root)
+            if ids:
+                self.pubmed_cache.set(f"esearch:{doi}", ids[0])
+                return ids[0]
             else:
                 raise Exception("No PubMed ID found for the given DOI")
         except Exception as e:
             raise Exception(f"Failed to search PubMed by DOI: {e}")
     
-    def process_pdf_upload(self, pdf_path: str) -> PaperMetadata:
-        full_text = self.extract_text_from_pdf(pdf_path)
-        
-        doi_match = re.search(r'doi:?\s*(10\.\d+/[^\s]+)', full_text, re.IGNORECASE)
+    def process_pdf_upload(self, pdf_path: str, max_chars: Optional[int] = None) -> PaperMetadata:
+        if max_chars:
+            return self._process_pdf_text(self.extract_text_up_to(pdf_path, max_chars))
+        return self._process_pdf_text(self.extract_text_from_pdf(pdf_path))
+    
+    def process_pdf_bytes(self, data: bytes, max_chars: Optional[int] = None) -> PaperMetadata:
+        if max_chars:
+            return self._process_pdf_text(self.extract_text_up_to(data, max_chars))
+        return self._process_pdf_text(self.extract_text_from_pdf_bytes(data))
+    
+    def _process_pdf_text(self, full_text: str) -> PaperMetadata:
+        doi_match = _DOI_RE.search(full_text, 0, DOI_SCAN_CHARS)
+        if doi_match and doi_match.end() == DOI_SCAN_CHARS:
+            # The DOI runs past the scan window, so re-match it unbounded
+            doi_match = _DOI_RE.match(full_text, doi_match.start())
         doi = doi_match.group(1) if doi_match else ""
         
         pubmed_id = ""
@@ -142,8 +326,10 @@ class PaperIngestionEngine:
             except:
                 pass
         
-        title_match = re.search(r'^([^\n]{10,200})', full_text.strip())
-        title = title_match.group(1).strip() if title_match else "Unknown Title"
+        # Match from the first non-blank character instead of copying the
+        # whole text with strip()
+        title_match = _TITLE_RE.match(full_text, _LEADING_WS_RE.match(full_text).end())
+        title = title_match.group(0).strip() if title_match else "Unknown Title"
         
         return PaperMetadata(
             title=title,
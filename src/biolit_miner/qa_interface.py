@@ -1,13 +1,22 @@
 import os
-from typing import List, Dict, Optional
+import asyncio
+import orjson
+from collections import deque
+from itertools import islice
+from typing import Deque, List, Dict, Optional, Sequence, Tuple
 from dataclasses import dataclass
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from dotenv import load_dotenv
 from .paper_ingestion import PaperMetadata
-from .method_extractor import ExtractedMethods
+from .methods import ExtractedMethods
+from .llm_client import get_shared_client, get_shared_async_client, truncate_to_tokens, QA_CONTEXT_TOKENS
+from .cache import SemanticCache, content_key
 
 load_dotenv()
 
+# Only the most recent exchanges are kept to manage memory
+MAX_HISTORY = 10
+
 @dataclass
 class QAExchange:
     question: str
@@ -20,34 +29,56 @@ class InteractiveQA:
         api_key = os.getenv('ANTHROPIC_API_KEY')
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
-        self.client = Anthropic(api_key=api_key)
+        self.api_key = api_key
+        self.client = get_shared_client(api_key)
         
         self.paper_metadata: Optional[PaperMetadata] = None
         self.extracted_methods: Optional[ExtractedMethods] = None
-        self.conversation_history: List[QAExchange] = []
+        self.conversation_history: Deque[QAExchange] = deque(maxlen=MAX_HISTORY)
+        self._suggested_questions: Optional[List[str]] = None
+        self._truncated_full_text = ""
+        self._paper_block = ""
+        self._methods_block = ""
+        self._cache_scope = ""
+        
+        # Answers to earlier opening questions about the same paper, matched
+        # exactly or, with an embedding model installed, by question similarity
+        self.semantic_cache = SemanticCache()
     
     def load_paper_context(self, paper_metadata: PaperMetadata, 
                           extracted_methods: ExtractedMethods):
         self.paper_metadata = paper_metadata
         self.extracted_methods = extracted_methods
+        self._suggested_questions = None
+        # Cut to the model's token budget once per paper rather than by a
+        # character count on every question
+        self._truncated_full_text = truncate_to_tokens(
+            self.client, paper_metadata.full_text, QA_CONTEXT_TOKENS
+        )
+        self._build_context_blocks()
+        # Scoped on the content the answers were given for, not its title
+        self._cache_scope = content_key(paper_metadata.full_text, self._methods_block)
     
     def ask_question(self, question: str) -> str:
         if not self.paper_metadata or not self.extracted_methods:
             return "Please load a paper first before asking questions."
         
-        # Create context-aware prompt
-        prompt = self._create_qa_prompt(question)
+        # Follow-up questions depend on the conversation so far, so only
+        # questions asked without history are looked up and cached
+        use_cache = not self.conversation_history
+        embedding = self.semantic_cache.embed(question) if use_cache else None
+        cached_answer = (self.semantic_cache.lookup(question, self._cache_scope, embedding)
+                         if use_cache else None)
+        if cached_answer is not None:
+            self._add_to_history(question, cached_answer)
+            return cached_answer
         
         try:
-            response = self.client.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=2000,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            response = self.client.messages.create(**self._create_qa_request(question, self.conversation_history))
             
             answer = response.content[0].text
+            if use_cache:
+                self.semantic_cache.add(question, answer, self._cache_scope, embedding)
             
             # Store in conversation history
             self._add_to_history(question, answer)
@@ -57,8 +88,79 @@ class InteractiveQA:
         except Exception as e:
             return f"Error processing question: {e}"
     
-    def _create_qa_prompt(self, question: str) -> str:
-        # Prepare paper context
+    async def ask_question_async(self, question: str) -> str:
+        if not self.paper_metadata or not self.extracted_methods:
+            return "Please load a paper first before asking questions."
+        
+        try:
+            answer = await self._answer_async(question, self.conversation_history)
+        except Exception as e:
+            return f"Error processing question: {e}"
+        
+        # Store in conversation history
+        self._add_to_history(question, answer)
+        
+        return answer
+    
+    async def ask_many(self, questions: List[str], max_concurrency: int = 8) -> List[str]:
+        if not self.paper_metadata or not self.extracted_methods:
+            return ["Please load a paper first before asking questions."] * len(questions)
+        
+        # Every question sees the history as it was before the batch, and the
+        # answers are added to it in input order once all of them are in, so
+        # neither depends on which request finishes first
+        history = list(self.conversation_history)
+        # Bound the number of in-flight requests to stay within rate limits
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def ask(question: str) -> Tuple[str, bool]:
+            async with semaphore:
+                try:
+                    return await self._answer_async(question, history), True
+                except Exception as e:
+                    return f"Error processing question: {e}", False
+        
+        results = await asyncio.gather(*[ask(q) for q in questions])
+        for question, (answer, answered) in zip(questions, results):
+            if answered:
+                self._add_to_history(question, answer)
+        return [answer for answer, _ in results]
+    
+    async def _answer_async(self, question: str, history: Sequence[QAExchange]) -> str:
+        # Follow-up questions depend on the conversation so far, so only
+        # questions asked without history are looked up and cached
+        use_cache = not history
+        embedding = self.semantic_cache.embed(question) if use_cache else None
+        cached_answer = (self.semantic_cache.lookup(question, self._cache_scope, embedding)
+                         if use_cache else None)
+        if cached_answer is not None:
+            return cached_answer
+        
+        response = await self._get_aclient().messages.create(**self._create_qa_request(question, history))
+        
+        answer = response.content[0].text
+        if use_cache:
+            self.semantic_cache.add(question, answer, self._cache_scope, embedding)
+        return answer
+    
+    def _get_aclient(self) -> AsyncAnthropic:
+        return get_shared_async_client(self.api_key)
+    
+    def _create_qa_request(self, question: str, history: Sequence[QAExchange]) -> Dict:
+        # Create context-aware prompt
+        content = self._create_qa_prompt(question, history)
+        
+        return {
+            "model": "claude-3-sonnet-20240229",
+            "max_tokens": 2000,
+            "messages": [
+                {"role": "user", "content": content}
+            ]
+        }
+    
+    def _build_context_blocks(self):
+        # The paper and methods blocks only depend on the loaded paper, so they
+        # are built once here instead of on every question
         paper_context = f"""
 Paper Title: {self.paper_metadata.title}
 Authors: {', '.join(self.paper_metadata.authors)}
@@ -69,13 +171,11 @@ Abstract:
 {self.paper_metadata.abstract}
 
 Full Text (excerpt):
-{self.paper_metadata.full_text[:8000]}  # Limit to avoid token limits
+{self._truncated_full_text}
 """
 
-        # Prepare methods context
-        methods_context = "Extracted Computational Methods:\n"
-        for method in self.extracted_methods.computational_methods:
-            methods_context += f"""
+        methods_context = "Extracted Computational Methods:\n" + "".join(
+            f"""
 - {method.name}:
   Description: {method.description}
   Software Tools: {', '.join(method.software_tools)}
@@ -83,51 +183,62 @@ Full Text (excerpt):
   Parameters: {method.parameters}
   Category: {method.category}
 """
+            for method in self.extracted_methods.computational_methods
+        )
 
-        datasets_context = "Datasets Used:\n"
-        for dataset in self.extracted_methods.datasets:
-            datasets_context += f"""
+        datasets_context = "Datasets Used:\n" + "".join(
+            f"""
 - {dataset.name}:
   Description: {dataset.description}
   Source: {dataset.source}
   Format: {dataset.format}
 """
+            for dataset in self.extracted_methods.datasets
+        )
 
-        workflows_context = "Analysis Workflows:\n"
-        for workflow in self.extracted_methods.workflows:
-            workflows_context += f"""
+        workflows_context = "Analysis Workflows:\n" + "".join(
+            f"""
 - {workflow.name}:
   Steps: {' → '.join(workflow.steps)}
   Input Data: {', '.join(workflow.input_data)}
   Output Data: {', '.join(workflow.output_data)}
   Dependencies: {', '.join(workflow.dependencies)}
 """
+            for workflow in self.extracted_methods.workflows
+        )
 
-        # Include recent conversation history for context
-        history_context = ""
-        if self.conversation_history:
-            history_context = "Recent Conversation:\n"
-            for exchange in self.conversation_history[-3:]:  # Last 3 exchanges
-                history_context += f"Q: {exchange.question}\nA: {exchange.answer}\n\n"
-
-        return f"""
+        self._paper_block = f"""
 You are an expert research assistant helping to answer questions about a scientific paper's methodology and computational approaches.
 
 {paper_context}
+"""
 
+        self._methods_block = f"""
 {methods_context}
 
 {datasets_context}
 
 {workflows_context}
 
-{history_context}
-
 Key Findings from the Paper:
 {chr(10).join(self.extracted_methods.key_findings)}
 
 Reproducibility Notes:
 {self.extracted_methods.reproducibility_notes}
+"""
+
+    def _create_qa_prompt(self, question: str, history: Sequence[QAExchange]) -> List[Dict]:
+        # Include recent conversation history for context
+        history_context = ""
+        if history:
+            history_context = "Recent Conversation:\n" + "".join(
+                f"Q: {exchange.question}\nA: {exchange.answer}\n\n"
+                for exchange in islice(history,  # Last 3 exchanges
+                                       max(len(history) - 3, 0), None)
+            )
+
+        question_block = f"""
+{history_context}
 
 User Question: {question}
 
@@ -141,6 +252,12 @@ Please provide a detailed, accurate answer based on the paper's content and meth
 If the question cannot be answered from the provided paper content, clearly state that and suggest what additional information might be needed.
 """
 
+        return [
+            {"type": "text", "text": self._paper_block},
+            {"type": "text", "text": self._methods_block},
+            {"type": "text", "text": question_block}
+        ]
+
     def _add_to_history(self, question: str, answer: str):
         from datetime import datetime
         
@@ -150,14 +267,11 @@ If the question cannot be answered from the provided paper content, clearly stat
             timestamp=datetime.now().isoformat(),
             context_used="paper_content_and_methods"
         )
+        # The deque's maxlen drops the oldest exchange once the history is full
         self.conversation_history.append(exchange)
-        
-        # Keep only last 10 exchanges to manage memory
-        if len(self.conversation_history) > 10:
-            self.conversation_history = self.conversation_history[-10:]
     
     def get_conversation_history(self) -> List[QAExchange]:
-        return self.conversation_history.copy()
+        return list(self.conversation_history)
     
     def clear_conversation(self):
         self.conversation_history.clear()
@@ -166,6 +280,11 @@ If the question cannot be answered from the provided paper content, clearly stat
         if not self.paper_metadata or not self.extracted_methods:
             return ["Please load a paper first."]
         
+        # Suggestions only depend on the loaded paper, and Streamlit asks for
+        # them on every rerun
+        if self._suggested_questions is not None:
+            return list(self._suggested_questions)
+        
         # Generate context-aware question suggestions
         prompt = f"""
 Based on this research paper's methodology and computational approaches, suggest 5-7 relevant questions that would help someone understand or reproduce the research.
@@ -201,7 +320,8 @@ Return only the questions, one per line, without numbering or additional text.
             )
             
             questions = response.content[0].text.strip().split('\n')
-            return [q.strip() for q in questions if q.strip()]
+            self._suggested_questions = [q.strip() for q in questions if q.strip()]
+            return list(self._suggested_questions)
             
         except Exception as e:
             return [
@@ -214,10 +334,8 @@ Return only the questions, one per line, without numbering or additional text.
                 "What are the main computational findings?"
             ]
     
-    def export_conversation(self, output_path: str):
-        import json
-        
-        export_data = {
+    def to_dict(self) -> Dict:
+        return {
             'paper_metadata': {
                 'title': self.paper_metadata.title if self.paper_metadata else None,
                 'authors': self.paper_metadata.authors if self.paper_metadata else [],
@@ -232,18 +350,18 @@ Return only the questions, one per line, without numbering or additional text.
                 for exchange in self.conversation_history
             ]
         }
-        
-        with open(output_path, 'w') as f:
-            json.dump(export_data, f, indent=2)
+    
+    def export_conversation(self, output_path: str):
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(self.to_dict(), option=orjson.OPT_INDENT_2))
     
     def load_conversation(self, input_path: str):
-        import json
         from datetime import datetime
         
-        with open(input_path, 'r') as f:
-            data = json.load(f)
+        with open(input_path, 'rb') as f:
+            data = orjson.loads(f.read())
         
-        self.conversation_history = [
+        self.conversation_history = deque((
             QAExchange(
                 question=item['question'],
                 answer=item['answer'],
@@ -251,4 +369,4 @@ Return only the questions, one per line, without numbering or additional text.
                 context_used="paper_content_and_methods"
             )
             for item in data['conversation_history']
-        ]
\ No newline at end of file
+        ), maxlen=MAX_HISTORY)
\ No newline at end of file
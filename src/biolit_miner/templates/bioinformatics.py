@@ -4,10 +4,10 @@ import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 from Bio import SeqIO, Seq, Align
-from Bio.SeqUtils import GC, molecular_weight
 from Bio.Blast import NCBIWWW, NCBIXML
 import requests
 import json
+import re
 
 def load_sequence_data(file_path, format='fasta'):
     """Load sequence data from various formats"""
@@ -21,36 +21,71 @@ def load_sequence_data(file_path, format='fasta'):
         })
     return pd.DataFrame(sequences)
 
+# Average monomer masses (Da) for unambiguous DNA, indexed by ASCII code;
+# any other letter maps to NaN
+DNA_WEIGHTS = np.full(256, np.nan)
+for base, weight in {'A': 331.2218, 'C': 307.1971, 'G': 347.2212, 'T': 322.2085}.items():
+    DNA_WEIGHTS[ord(base)] = weight
+WATER_WEIGHT = 18.0153
+
+def encode_sequences(sequences):
+    """Pack sequences into one uint8 buffer plus each sequence's offset and length"""
+    encoded = [str(seq).upper().encode('ascii') for seq in sequences]
+    lengths = np.fromiter((len(seq) for seq in encoded), dtype=np.int64, count=len(encoded))
+    buf = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+    return buf, offsets, lengths
+
+def per_sequence_sum(values, offsets, lengths, dtype=np.int64):
+    """Sum per-byte values over each sequence's slice of the packed buffer"""
+    # reduceat works on segment offsets, so no per-base index array is needed;
+    # empty sequences are left out since their segment would not be empty
+    sums = np.zeros(len(lengths), dtype=dtype)
+    non_empty = lengths > 0
+    if non_empty.any():
+        sums[non_empty] = np.add.reduceat(values, offsets[non_empty], dtype=dtype)
+    return sums
+
+def base_counts(buf, offsets, lengths, bases):
+    """Count each base per sequence in a single vectorized pass"""
+    return {
+        base: per_sequence_sum(buf == ord(base), offsets, lengths)
+        for base in bases
+    }
+
+def gc_percent(buf, offsets, lengths, dtype=np.float64):
+    """GC content (%) per sequence; S (G or C) counts towards GC"""
+    is_gc = (buf == ord('G')) | (buf == ord('C')) | (buf == ord('S'))
+    gc_counts = per_sequence_sum(is_gc, offsets, lengths)
+    gc = np.zeros(len(lengths), dtype=dtype)
+    np.divide(gc_counts * 100.0, lengths, out=gc, where=lengths > 0, casting='unsafe')
+    return gc
+
 def sequence_statistics(sequences_df):
     """Calculate basic sequence statistics"""
-    stats = {}
+    buf, offsets, lengths = encode_sequences(sequences_df['sequence'])
+    counts = base_counts(buf, offsets, lengths, 'ATGC')
     
-    for idx, row in sequences_df.iterrows():
-        seq = Seq.Seq(row['sequence'])
-        stats[row['id']] = {
-            'length': len(seq),
-            'gc_content': GC(seq),
-            'molecular_weight': molecular_weight(seq, 'DNA'),
-            'nucleotide_counts': {
-                'A': seq.count('A'),
-                'T': seq.count('T'),
-                'G': seq.count('G'),
-                'C': seq.count('C')
-            }
-        }
-    
-    stats_df = pd.DataFrame(stats).T
+    # Molecular weight of single-stranded DNA: sum of monomers minus one water
+    # per phosphodiester bond; sequences with ambiguous bases get NaN
+    monomer_sums = per_sequence_sum(DNA_WEIGHTS[buf], offsets, lengths, dtype=np.float64)
+    molecular_weights = monomer_sums - (lengths - 1) * WATER_WEIGHT
+    
+    stats_df = pd.DataFrame({
+        'length': lengths,
+        'gc_content': gc_percent(buf, offsets, lengths),
+        'molecular_weight': molecular_weights,
+        **counts
+    }, index=sequences_df['id'].values)
     print("Sequence Statistics:")
     print(stats_df)
     return stats_df
 
 def gc_content_analysis(sequences_df):
     """Analyze GC content distribution"""
-    gc_contents = []
-    
-    for idx, row in sequences_df.iterrows():
-        gc = GC(row['sequence'])
-        gc_contents.append(gc)
+    buf, offsets, lengths = encode_sequences(sequences_df['sequence'])
+    # float32 is ample precision for a percentage and halves the array size
+    gc_contents = gc_percent(buf, offsets, lengths, dtype=np.float32)
     
     plt.figure(figsize=(10, 6))
     plt.hist(gc_contents, bins=20, alpha=0.7, edgecolor='black')
@@ -106,62 +141,91 @@ def blast_search(sequence, database='nt', max_hits=10):
         print(f"BLAST search failed: {e}")
         return pd.DataFrame()
 
+# Motifs made only of letters and digits are matched as plain literals
+LITERAL_MOTIF = re.compile(r'[A-Za-z0-9]+')
+
 def motif_analysis(sequences_df, motif_pattern):
     """Search for motifs in sequences"""
-    import re
+    ids = sequences_df['id'].tolist()
+    sequences = [str(seq) for seq in sequences_df['sequence']]
+    pattern = re.compile(motif_pattern, re.IGNORECASE)
+    columns = ['sequence_id', 'motif', 'start_position', 'end_position']
     
-    motif_results = []
+    if not LITERAL_MOTIF.fullmatch(motif_pattern):
+        motif_df = pd.DataFrame([
+            (seq_id, match.group(), match.start(), match.end())
+            for seq_id, sequence in zip(ids, sequences)
+            for match in pattern.finditer(sequence)
+        ], columns=columns)
+        print(f"Found {len(motif_df)} motif matches")
+        return motif_df
     
-    for idx, row in sequences_df.iterrows():
-        sequence = row['sequence']
-        matches = list(re.finditer(motif_pattern, sequence, re.IGNORECASE))
-        
-        for match in matches:
-            motif_results.append({
-                'sequence_id': row['id'],
-                'motif': match.group(),
-                'start_position': match.start(),
-                'end_position': match.end()
-            })
-    
-    motif_df = pd.DataFrame(motif_results)
+    # A literal cannot span the newline separator, so all sequences are scanned
+    # in one pass and hits are mapped back to (sequence, local position)
+    matches = list(pattern.finditer("\n".join(sequences)))
+    starts = np.fromiter((match.start() for match in matches), dtype=np.int64, count=len(matches))
+    offsets = np.concatenate(([0], np.cumsum([len(seq) + 1 for seq in sequences[:-1]], dtype=np.int64)))
+    seq_pos = np.searchsorted(offsets, starts, side='right') - 1
+    local_starts = starts - offsets[seq_pos]
+    
+    motif_df = pd.DataFrame({
+        'sequence_id': np.asarray(ids, dtype=object)[seq_pos],
+        'motif': [match.group() for match in matches],
+        'start_position': local_starts,
+        'end_position': local_starts + len(motif_pattern)
+    }, columns=columns)
     print(f"Found {len(motif_df)} motif matches")
     return motif_df
 
+# IUPAC complement table for reverse complements without building Seq objects
+COMPLEMENT = str.maketrans("ACGTRYKMBVDHNSWacgtrykmbvdhnsw", "TGCAYRMKVBHDNSWtgcayrmkvbhdnsw")
+
 def reading_frame_analysis(sequence):
     """Analyze all six reading frames"""
     frames = {}
+    # Slice each frame straight to its last complete codon
+    frame_ends = [i + (len(sequence) - i) // 3 * 3 for i in range(3)]
     
     # Forward frames
     for i in range(3):
-        frame_seq = sequence[i:]
-        # Remove incomplete codons
-        frame_seq = frame_seq[:len(frame_seq)//3*3]
-        frames[f'Frame +{i+1}'] = frame_seq
+        frames[f'Frame +{i+1}'] = sequence[i:frame_ends[i]]
     
     # Reverse complement frames
-    rev_comp = str(Seq.Seq(sequence).reverse_complement())
+    rev_comp = sequence.translate(COMPLEMENT)[::-1]
     for i in range(3):
-        frame_seq = rev_comp[i:]
-        frame_seq = frame_seq[:len(frame_seq)//3*3]
-        frames[f'Frame -{i+1}'] = frame_seq
+        frames[f'Frame -{i+1}'] = rev_comp[i:frame_ends[i]]
     
     return frames
 
+# Maps A/C/G/T (either case) to 0-3 so each codon becomes an index in 0-63;
+# every other byte maps to 255 and marks the codon as ambiguous
+BASE_INDEX = np.full(256, 255, dtype=np.uint8)
+for i, base in enumerate('ACGT'):
+    BASE_INDEX[ord(base)] = BASE_INDEX[ord(base.lower())] = i
+CODONS = np.array([a + b + c for a in 'ACGT' for b in 'ACGT' for c in 'ACGT'])
+
 def codon_usage_analysis(sequences_df):
     """Analyze codon usage patterns"""
-    from collections import Counter
+    buf, offsets, lengths = encode_sequences(sequences_df['sequence'])
+    bases = BASE_INDEX[buf]
     
-    all_codons = []
+    # Codons start every third base of each sequence (assuming sequences start
+    # at the reading frame) and must fit completely inside it. Positions are
+    # built per codon rather than per base: the j-th codon overall, belonging
+    # to a sequence whose codons are numbered from first_codon, starts at
+    # offset + 3 * (j - first_codon)
+    n_codons = lengths // 3
+    first_codon = np.concatenate(([0], np.cumsum(n_codons)[:-1]))
+    codon_starts = np.repeat(offsets - 3 * first_codon, n_codons)
+    codon_starts += 3 * np.arange(len(codon_starts))
     
-    for idx, row in sequences_df.iterrows():
-        sequence = row['sequence']
-        # Extract codons (assuming sequence starts at reading frame)
-        codons = [sequence[i:i+3] for i in range(0, len(sequence)-2, 3)]
-        all_codons.extend(codons)
+    first, second, third = bases[codon_starts], bases[codon_starts + 1], bases[codon_starts + 2]
+    valid = (first < 4) & (second < 4) & (third < 4)
+    codon_index = (first[valid].astype(np.int64) * 16 + second[valid] * 4 + third[valid])
+    counts = np.bincount(codon_index, minlength=64)
     
-    codon_counts = Counter(all_codons)
-    codon_df = pd.DataFrame(list(codon_counts.items()), columns=['Codon', 'Count'])
+    observed = counts > 0
+    codon_df = pd.DataFrame({'Codon': CODONS[observed], 'Count': counts[observed]})
     codon_df = codon_df.sort_values('Count', ascending=False)
     
     plt.figure(figsize=(15, 8))